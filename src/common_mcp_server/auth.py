@@ -8,21 +8,86 @@ Copyright 2025 Originate Group
 Licensed under the Apache License, Version 2.0
 """
 
+import asyncio
+import copy
+import hashlib
 import logging
-from typing import Optional, Callable, Awaitable
+import random
+import time
+from typing import Any, Optional, Callable, Awaitable
 from dataclasses import dataclass
 
+import cachetools
 import httpx
 from fastapi import Request, HTTPException
-from jose import jwt, JWTError
-from jose.exceptions import ExpiredSignatureError, JWTClaimsError
+import jwt
+from jwt import (
+    ExpiredSignatureError,
+    ImmatureSignatureError,
+    InvalidAudienceError,
+    InvalidIssuerError,
+    InvalidTokenError,
+    PyJWKError,
+    PyJWKSetError,
+)
 
 logger = logging.getLogger("common-mcp-server.auth")
 
+# Minimum seconds between forced JWKS refreshes triggered by an unknown kid,
+# so tokens with made-up kids can't be used to hammer the identity provider
+JWKS_MIN_REFRESH_INTERVAL = 30.0
+
+# Fraction of jwks_cache_ttl by which each JWKS refresh may come early, at random,
+# so replicas started together don't all hit the identity provider at once
+JWKS_REFRESH_JITTER = 0.1
+
+# Seconds to remember a rejected credential and answer 401 without re-validating it
+BAD_TOKEN_CACHE_TTL = 60.0
+
+# ASGI header names arrive lowercased as bytes, so compare against these directly
+_AUTHORIZATION_HEADER = b"authorization"
+_USER_AGENT_HEADER = b"user-agent"
+
+
+def scan_auth_headers(
+    scope: dict,
+    pat_header: Optional[bytes],
+) -> tuple[Optional[bytes], Optional[bytes], Optional[bytes]]:
+    """Extract auth-related header values in a single pass over the ASGI headers.
+
+    Args:
+        scope: ASGI connection scope
+        pat_header: Lowercased PAT header name as bytes, or None if PAT is not used
+
+    Returns:
+        tuple: Raw (PAT, Authorization, User-Agent) values; None for missing headers.
+            The first occurrence wins, matching Starlette's Headers.get().
+    """
+    pat = authorization = user_agent = None
+    for name, value in scope["headers"]:
+        if name == pat_header:
+            if pat is None:
+                pat = value
+        elif name == _AUTHORIZATION_HEADER:
+            if authorization is None:
+                authorization = value
+        elif name == _USER_AGENT_HEADER:
+            if user_agent is None:
+                user_agent = value
+    return pat, authorization, user_agent
+
 
 class TokenValidationError(Exception):
-    """Custom exception for token validation errors."""
-    pass
+    """Custom exception for token validation errors.
+
+    Attributes:
+        transient: True if the failure is not the token's fault (e.g., the JWKS
+                   endpoint was unreachable) and the token may succeed on retry
+    """
+
+    def __init__(self, message: str, transient: bool = False):
+        super().__init__(message)
+        self.transient = transient
 
 
 @dataclass
@@ -35,12 +100,28 @@ class OAuthConfig:
         algorithms: List of allowed JWT signing algorithms (default: ["RS256"])
         verify_audience: Whether to verify audience claim (default: False)
         audience: Expected audience value if verify_audience is True
+        jwks_cache_ttl: Seconds to cache the fetched JWKS before refetching (default: 300)
+        jwks_stale_ttl: Seconds past jwks_cache_ttl that stale keys are still served
+                        while they refresh in the background (default: 600)
+        token_cache_ttl: Maximum seconds to cache a validated token; entries never
+                         outlive the token's own exp claim (default: 300)
+        leeway: Seconds of clock skew tolerated between the identity provider and
+                this server when checking exp, nbf, and iat (default: 30)
+        passthrough_claims: Include every JWT claim in the user dict alongside the
+                            canonical keys, like extra PAT verify_function fields.
+                            Costs a copy of the nested claims per request
+                            (default: False, canonical keys only)
     """
     jwks_url: str
     issuer: str
     algorithms: list[str] = None
     verify_audience: bool = False
     audience: Optional[str] = None
+    jwks_cache_ttl: float = 300
+    jwks_stale_ttl: float = 600
+    token_cache_ttl: float = 300
+    leeway: float = 30
+    passthrough_claims: bool = False
 
     def __post_init__(self):
         if self.algorithms is None:
@@ -91,22 +172,207 @@ class DualAuthenticator:
         self.oauth_config = oauth_config
         self.pat_config = pat_config
         self.resource_url = resource_url
-        self._jwks_cache: Optional[dict] = None
+        self._pat_header = pat_config.header_name.lower().encode("latin-1") if pat_config else None
+        # Prepared public keys from the JWKS, keyed by kid
+        self._jwks_cache: Optional[dict[str, Any]] = None
+        self._jwks_cache_expiry: float = 0
+        self._jwks_stale_expiry: float = 0
+        self._jwks_fetched_at: float = 0
+        self._jwks_lock = asyncio.Lock()
+        self._jwks_inflight: Optional[asyncio.Task] = None
+        self._jwks_refresh_task: Optional[asyncio.Task] = None
+
+        # Validated OAuth tokens keyed by SHA-256 of the token. Values are
+        # (user, exp) tuples; each entry expires at min(exp, now + token_cache_ttl).
+        self._token_cache: Optional[cachetools.TLRUCache] = None
+        if oauth_config:
+            max_ttl = oauth_config.token_cache_ttl
+            self._token_cache = cachetools.TLRUCache(
+                maxsize=10_000,
+                ttu=lambda _key, value, now: min(value[1], now + max_ttl),
+                timer=time.time,
+            )
+
+        # Recently rejected credentials, keyed by blake2b digest of the header value.
+        # Values are (detail, WWW-Authenticate) so repeat offenders skip validation.
+        self._bad_token_cache = cachetools.TTLCache(maxsize=2048, ttl=BAD_TOKEN_CACHE_TTL)
+
+        # Shared client so JWKS fetches reuse pooled keep-alive connections. Created
+        # on first fetch (so PAT-only servers never get one) and again after aclose(),
+        # so the authenticator survives repeated app startup/shutdown cycles.
+        self._http: Optional[httpx.AsyncClient] = None
+
+    def _create_http_client(self) -> httpx.AsyncClient:
+        """Create the pooled HTTP/2 client used for JWKS fetches."""
+        return httpx.AsyncClient(
+            timeout=10.0,
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+        )
+
+    async def aclose(self) -> None:
+        """Stop any pending JWKS fetch and close the shared HTTP client, if any.
 
-    async def _get_jwks(self) -> dict:
-        """Fetch Keycloak's JSON Web Key Set for token validation."""
+        Call on application shutdown. The authenticator stays usable: the next
+        JWKS fetch creates a new client.
+        """
+        for task in (self._jwks_refresh_task, self._jwks_inflight):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, TokenValidationError):
+                    pass
+        http, self._http = self._http, None
+        if http is not None:
+            await http.aclose()
+
+    async def _get_jwks(self, force_refresh: bool = False) -> dict[str, Any]:
+        """Return Keycloak's signing keys by kid, fetching them if the cache is stale.
+
+        Keys are fresh for about ``oauth_config.jwks_cache_ttl`` seconds (with jitter
+        so replicas don't refresh in lockstep). For ``jwks_stale_ttl`` seconds after
+        that, the stale keys are still returned while a background task refreshes
+        them. Only past that point, or with nothing cached, does the caller wait on
+        the fetch.
+
+        Args:
+            force_refresh: Refetch even if the cache is fresh (used for unknown kids).
+                Ignored if the keys were fetched less than JWKS_MIN_REFRESH_INTERVAL ago.
+        """
         if not self.oauth_config:
             raise TokenValidationError("OAuth not configured")
 
-        # TODO: Add caching with TTL
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            try:
-                response = await client.get(self.oauth_config.jwks_url)
-                response.raise_for_status()
-                return response.json()
-            except Exception as e:
-                logger.error(f"Failed to fetch JWKS: {e}")
-                raise TokenValidationError(f"Unable to fetch public keys: {e}")
+        # Fast paths: no locking needed
+        if self._jwks_cache is not None:
+            now = time.monotonic()
+            if force_refresh:
+                if now - self._jwks_fetched_at < JWKS_MIN_REFRESH_INTERVAL:
+                    return self._jwks_cache
+            elif now < self._jwks_cache_expiry:
+                return self._jwks_cache
+            elif now < self._jwks_stale_expiry:
+                # Serve stale keys; refresh off the request path
+                if self._jwks_refresh_task is None:
+                    self._jwks_refresh_task = asyncio.create_task(self._background_refresh_jwks())
+                return self._jwks_cache
+
+        return await self._refresh_jwks(force_refresh)
+
+    async def _background_refresh_jwks(self) -> None:
+        """Refresh the JWKS cache from a background task."""
+        try:
+            await self._refresh_jwks()
+        except TokenValidationError:
+            # Already logged by _fetch_jwks. Keep serving stale keys, but back off
+            # so every request doesn't start another refresh.
+            self._jwks_cache_expiry = min(
+                time.monotonic() + JWKS_MIN_REFRESH_INTERVAL,
+                self._jwks_stale_expiry,
+            )
+        finally:
+            self._jwks_refresh_task = None
+
+    async def _refresh_jwks(self, force_refresh: bool = False) -> dict[str, Any]:
+        """Fetch the JWKS into the cache; concurrent callers share one fetch."""
+        async with self._jwks_lock:
+            # Re-check: another caller may have refreshed while we waited
+            now = time.monotonic()
+            if self._jwks_cache is not None:
+                if force_refresh:
+                    if now - self._jwks_fetched_at < JWKS_MIN_REFRESH_INTERVAL:
+                        return self._jwks_cache
+                elif now < self._jwks_cache_expiry:
+                    return self._jwks_cache
+
+            inflight = self._jwks_inflight
+            if inflight is None:
+                inflight = asyncio.create_task(self._fetch_and_store_jwks())
+                # Retrieve the outcome so a failure nobody awaited isn't logged as unhandled
+                inflight.add_done_callback(lambda t: t.cancelled() or t.exception())
+                self._jwks_inflight = inflight
+
+        # Every caller, including the one that started the fetch, waits through a
+        # shield so one caller being cancelled can't abort the fetch for the others
+        return await asyncio.shield(inflight)
+
+    async def _fetch_and_store_jwks(self) -> dict[str, Any]:
+        """Fetch the JWKS and update the cache; runs as the shared in-flight task."""
+        try:
+            jwks = await self._fetch_jwks()
+            ttl = self.oauth_config.jwks_cache_ttl
+            self._jwks_cache = jwks
+            self._jwks_fetched_at = time.monotonic()
+            self._jwks_cache_expiry = (
+                self._jwks_fetched_at + ttl * (1 - JWKS_REFRESH_JITTER * random.random())
+            )
+            self._jwks_stale_expiry = (
+                self._jwks_fetched_at + ttl + self.oauth_config.jwks_stale_ttl
+            )
+            return jwks
+        finally:
+            self._jwks_inflight = None
+
+    async def _fetch_jwks(self) -> dict[str, Any]:
+        """Fetch Keycloak's JSON Web Key Set and prepare its public keys.
+
+        Returns:
+            dict: Public key objects keyed by kid, ready to pass to jwt.decode
+        """
+        if self._http is None or self._http.is_closed:
+            self._http = self._create_http_client()
+
+        try:
+            response = await self._http.get(self.oauth_config.jwks_url)
+            response.raise_for_status()
+            jwk_set = jwt.PyJWKSet.from_dict(response.json())
+            return {key.key_id: key.key for key in jwk_set.keys}
+        except Exception as e:
+            logger.error("Failed to fetch JWKS: %s", e)
+            raise TokenValidationError(f"Unable to fetch public keys: {e}", transient=True)
+
+    def _copy_user(self, user: dict) -> dict:
+        """Copy a cached user dict so callers can't mutate the cached entry.
+
+        Passed-through claims may be nested (e.g., realm_access.roles), so nested
+        containers are deep-copied; scalar claims and canonical-only dicts are flat
+        and only need the top-level copy.
+        """
+        if self.oauth_config.passthrough_claims:
+            return {
+                key: copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+                for key, value in user.items()
+            }
+        return dict(user)
+
+    @staticmethod
+    def _lookup_key(keys: dict[str, Any], kid: Optional[str]) -> Optional[Any]:
+        """Find the key for kid; a token without kid matches a single-key JWKS."""
+        if kid is None:
+            return next(iter(keys.values())) if len(keys) == 1 else None
+        return keys.get(kid)
+
+    async def _get_signing_key(self, token: str) -> Any:
+        """Return the public key matching the token's ``kid`` header.
+
+        An unknown kid triggers one JWKS refresh in case the keys were rotated.
+
+        Raises:
+            TokenValidationError: If no matching key is found. The error is transient
+                if the forced refresh was skipped (see JWKS_MIN_REFRESH_INTERVAL), since
+                the key may simply not have been fetched yet.
+        """
+        kid = jwt.get_unverified_header(token).get("kid")
+        fetched_at = self._jwks_fetched_at
+        key = self._lookup_key(await self._get_jwks(), kid)
+        if key is None:
+            key = self._lookup_key(await self._get_jwks(force_refresh=True), kid)
+        if key is None:
+            raise TokenValidationError(
+                f"Invalid token: no signing key found for kid '{kid}'",
+                transient=self._jwks_fetched_at == fetched_at,
+            )
+        return key
 
     async def _validate_oauth_token(self, authorization: Optional[str]) -> dict:
         """Validate OAuth access token and extract user information.
@@ -115,7 +381,8 @@ class DualAuthenticator:
             authorization: The Authorization header value (Bearer <token>)
 
         Returns:
-            dict: Token payload with user information
+            dict: User information with keys user_id, email, username, name, and
+                auth_method, plus all JWT claims if passthrough_claims is enabled
 
         Raises:
             TokenValidationError: If token is invalid or expired
@@ -126,16 +393,21 @@ class DualAuthenticator:
         if not authorization or not authorization.startswith("Bearer "):
             raise TokenValidationError("Missing or invalid Authorization header")
 
-        token = authorization.replace("Bearer ", "")
+        token = authorization[len("Bearer "):]
+
+        cache_key = hashlib.sha256(token.encode()).digest()
+        cached = self._token_cache.get(cache_key)
+        if cached is not None:
+            return self._copy_user(cached[0])
 
         try:
-            # Fetch JWKS for signature verification
-            jwks = await self._get_jwks()
+            # Look up the signing key from the cached JWKS
+            signing_key = await self._get_signing_key(token)
 
             # Decode and validate token
             payload = jwt.decode(
                 token,
-                jwks,
+                signing_key,
                 algorithms=self.oauth_config.algorithms,
                 issuer=self.oauth_config.issuer,
                 options={
@@ -147,26 +419,46 @@ class DualAuthenticator:
                     "verify_iss": True,
                 },
                 audience=self.oauth_config.audience if self.oauth_config.verify_audience else None,
+                leeway=self.oauth_config.leeway,
             )
 
-            logger.info(f"✅ OAuth token validated for user: {payload.get('sub')}")
-            return {
-                "user_id": payload.get("sub"),
-                "email": payload.get("email"),
-                "username": payload.get("preferred_username"),
-                "name": payload.get("name"),
-                "auth_method": "oauth",
-            }
-
+            logger.info("✅ OAuth token validated for user: %s", payload.get("sub"))
+            if self.oauth_config.passthrough_claims:
+                # Reuse the payload as the user dict so all JWT claims (e.g., realm_access)
+                # reach tool handlers, like extra fields from a PAT verify_function do
+                user = payload
+                user["user_id"] = payload.get("sub")
+                user["username"] = payload.get("preferred_username")
+                user.setdefault("email", None)
+                user.setdefault("name", None)
+                user["auth_method"] = "oauth"
+            else:
+                user = {
+                    "user_id": payload.get("sub"),
+                    "email": payload.get("email"),
+                    "username": payload.get("preferred_username"),
+                    "name": payload.get("name"),
+                    "auth_method": "oauth",
+                }
+            exp = payload.get("exp")
+            if isinstance(exp, (int, float)):
+                self._token_cache[cache_key] = (user, exp)
+            return self._copy_user(user)
+
+        except TokenValidationError:
+            raise
         except ExpiredSignatureError:
             raise TokenValidationError("Token has expired")
-        except JWTClaimsError as e:
+        except ImmatureSignatureError as e:
+            # nbf/iat in the future: the token may become valid moments from now
+            raise TokenValidationError(f"Invalid token: {e}", transient=True)
+        except (InvalidAudienceError, InvalidIssuerError) as e:
             raise TokenValidationError(f"Invalid token claims: {e}")
-        except JWTError as e:
+        except (InvalidTokenError, PyJWKError, PyJWKSetError) as e:
             raise TokenValidationError(f"Invalid token: {e}")
         except Exception as e:
-            logger.error(f"Unexpected error validating OAuth token: {e}")
-            raise TokenValidationError(f"Token validation failed: {e}")
+            logger.error("Unexpected error validating OAuth token: %s", e)
+            raise TokenValidationError(f"Token validation failed: {e}", transient=True)
 
     async def _validate_pat(self, token: str, request: Request) -> dict:
         """Validate Personal Access Token.
@@ -194,22 +486,51 @@ class DualAuthenticator:
         if not user:
             raise TokenValidationError("Invalid or expired personal access token")
 
-        logger.info(f"✅ PAT authenticated for user: {user.get('email')}")
+        logger.info("✅ PAT authenticated for user: %s", user.get("email"))
 
         # Ensure consistent user structure while preserving all fields from verify_function
-        # This allows application-specific fields (like organization_ids) to pass through
-        result = {
-            "user_id": user.get("user_id"),
-            "email": user.get("email"),
-            "username": user.get("username"),
-            "name": user.get("name"),
+        # This allows application-specific fields (like organization_ids) to pass through.
+        # Canonical keys default to None if verify_function omits them; auth_method is
+        # always "pat".
+        return {
+            "user_id": None,
+            "email": None,
+            "username": None,
+            "name": None,
+            **user,
             "auth_method": "pat",
         }
-        # Preserve any additional fields from the verify function (e.g., organization_ids)
-        for key, value in user.items():
-            if key not in result:
-                result[key] = value
-        return result
+
+    @staticmethod
+    def _bad_token_key(value: str, kind: bytes) -> bytes:
+        """Hash a credential header value for the rejected-credential cache."""
+        return hashlib.blake2b(value.encode(), digest_size=16, person=kind).digest()
+
+    def _reject(
+        self,
+        key: Optional[bytes],
+        error: TokenValidationError,
+        www_authenticate: str,
+    ):
+        """Raise a 401 for error, remembering the credential unless the failure is transient."""
+        if key is not None and not error.transient:
+            self._bad_token_cache[key] = (str(error), www_authenticate)
+        raise HTTPException(
+            status_code=401,
+            detail=str(error),
+            headers={"WWW-Authenticate": www_authenticate}
+        )
+
+    def _check_bad_token(self, key: bytes):
+        """Raise the cached 401 if this credential was recently rejected."""
+        cached = self._bad_token_cache.get(key)
+        if cached is not None:
+            detail, www_authenticate = cached
+            raise HTTPException(
+                status_code=401,
+                detail=detail,
+                headers={"WWW-Authenticate": www_authenticate}
+            )
 
     async def authenticate(self, request: Request) -> dict:
         """Authenticate request using PAT or OAuth.
@@ -221,44 +542,60 @@ class DualAuthenticator:
         Args:
             request: FastAPI request object
 
+        On success, the credential that was accepted is stored on the request as
+        ``request.state.auth_token`` (raw header value) and ``request.state.is_pat``
+        so later handlers don't need to re-read the headers.
+
         Returns:
-            dict: User information with keys: user_id, email, username, name, auth_method
+            dict: User information with keys: user_id, email, username, name, auth_method,
+                _user_agent (client User-Agent header, or None; underscored so it can't
+                collide with a verify_function field or JWT claim)
 
         Raises:
             HTTPException: 401 if authentication fails
         """
+        pat_raw, authorization_raw, user_agent_raw = scan_auth_headers(
+            request.scope, self._pat_header
+        )
+        user_agent = user_agent_raw.decode("latin-1") if user_agent_raw else None
+
         # Try PAT authentication first
-        if self.pat_config:
-            pat_token = request.headers.get(self.pat_config.header_name)
-            if pat_token:
-                try:
-                    return await self._validate_pat(pat_token, request)
-                except TokenValidationError as e:
-                    logger.warning(f"PAT validation failed: {e}")
-                    raise HTTPException(
-                        status_code=401,
-                        detail=str(e),
-                        headers={"WWW-Authenticate": "Bearer"}
-                    )
+        if self.pat_config and pat_raw:
+            pat_token = pat_raw.decode("latin-1")
+            key = self._bad_token_key(pat_token, b"pat")
+            self._check_bad_token(key)
+            try:
+                user = await self._validate_pat(pat_token, request)
+            except TokenValidationError as e:
+                logger.warning("PAT validation failed: %s", e)
+                self._reject(key, e, "Bearer")
+            request.state.auth_token = pat_token
+            request.state.is_pat = True
+            user["_user_agent"] = user_agent
+            return user
 
         # Fall back to OAuth authentication
         if self.oauth_config:
-            authorization = request.headers.get("Authorization")
+            authorization = authorization_raw.decode("latin-1") if authorization_raw else None
+            key = None
+            if authorization:
+                key = self._bad_token_key(authorization, b"oauth")
+                self._check_bad_token(key)
             try:
-                return await self._validate_oauth_token(authorization)
+                user = await self._validate_oauth_token(authorization)
+                request.state.auth_token = authorization
+                request.state.is_pat = False
+                user["_user_agent"] = user_agent
+                return user
             except TokenValidationError as e:
-                logger.warning(f"OAuth validation failed: {e}")
+                logger.warning("OAuth validation failed: %s", e)
 
                 # Construct WWW-Authenticate header
                 www_authenticate = "Bearer"
                 if self.resource_url:
                     www_authenticate += f' resource_metadata="{self.resource_url}/.well-known/oauth-protected-resource"'
 
-                raise HTTPException(
-                    status_code=401,
-                    detail=str(e),
-                    headers={"WWW-Authenticate": www_authenticate}
-                )
+                self._reject(key, e, www_authenticate)
 
         # No authentication method available
         raise HTTPException(
@@ -13,13 +13,34 @@ Licensed under the Apache License, Version 2.0
 import logging
 from typing import Any, Callable, Awaitable, Optional
 
+import orjson
 from mcp.types import Tool, TextContent
 from fastapi import Request
-from fastapi.responses import JSONResponse, Response
+from fastapi.responses import Response
+
+from .auth import scan_auth_headers
 
 logger = logging.getLogger("common-mcp-server.protocol")
 
 
+def _json(content: Any, status_code: int = 200) -> Response:
+    """Build a JSON response encoded with orjson.
+
+    Payloads are plain dicts of primitives, so FastAPI's jsonable_encoder is not needed.
+    """
+    return Response(
+        content=orjson.dumps(content),
+        status_code=status_code,
+        media_type="application/json",
+    )
+
+
+def _json_result(request_id: Any, result_json: bytes) -> Response:
+    """Build a JSON-RPC success response around an already-serialized result."""
+    content = b'{"jsonrpc":"2.0","id":' + orjson.dumps(request_id) + b',"result":' + result_json
+    return Response(content=content + b"}", media_type="application/json")
+
+
 class MCPProtocolHandler:
     """Handles MCP protocol messages over HTTP."""
 
@@ -29,6 +50,8 @@ class MCPProtocolHandler:
         server_version: str,
         list_tools_fn: Callable[[], Awaitable[list[Tool]]],
         call_tool_fn: Callable[[str, dict, Optional[str], dict, bool], Awaitable[list[TextContent]]],
+        cache_tools: bool = False,
+        pat_header_name: Optional[str] = "X-API-Key",
     ):
         """Initialize the protocol handler.
 
@@ -38,18 +61,86 @@ class MCPProtocolHandler:
             list_tools_fn: Async function to list available tools
             call_tool_fn: Async function to execute a tool
                 Signature: (name, arguments, auth_token, user, is_pat) -> list[TextContent]
-                Where user is the full user dict from authentication (includes user_id, email, name, etc.)
+                Where user is the full user dict from authentication (includes user_id, email, name,
+                _user_agent, etc.)
+            cache_tools: Cache the tools/list result until invalidate_tools() is called.
+                Enable when the tool set is static or changes only at known points.
+            pat_header_name: PAT header to read in tools/call when the request was not
+                authenticated by DualAuthenticator (None if PAT is not used)
         """
         self.server_name = server_name
         self.server_version = server_version
         self.list_tools_fn = list_tools_fn
         self.call_tool_fn = call_tool_fn
+        self.cache_tools = cache_tools
+        self._pat_header = pat_header_name.lower().encode("latin-1") if pat_header_name else None
+
+        # The initialize result never changes, so serialize it once
+        self._initialize_result_json = orjson.dumps({
+            "protocolVersion": "2024-11-05",
+            "capabilities": {
+                "tools": {
+                    "listChanged": True
+                },
+            },
+            "serverInfo": {
+                "name": self.server_name,
+                "version": self.server_version
+            }
+        })
+
+        # (tool count, serialized tools/list result); _tools_version guards against
+        # storing a result that was invalidated while list_tools_fn was running
+        self._tools_cache: Optional[tuple[int, bytes]] = None
+        self._tools_version = 0
+
+        # Method name -> handler; all handlers take (request_id, params, request, user)
+        self._dispatch: dict[
+            str, Callable[[Any, dict, Request, dict], Awaitable[Response]]
+        ] = {
+            "initialize": self._handle_initialize,
+            "initialized": self._handle_initialized,
+            "tools/list": self._handle_tools_list,
+            "tools/call": self._handle_tools_call,
+        }
+
+    def invalidate_tools(self) -> None:
+        """Drop the cached tools/list result so the next call re-queries list_tools_fn."""
+        self._tools_version += 1
+        self._tools_cache = None
+
+    async def _get_tools_result(self) -> tuple[int, bytes]:
+        """Return the tool count and serialized tools/list result, cached if enabled."""
+        if self._tools_cache is not None:
+            return self._tools_cache
+
+        version = self._tools_version
+        tools = await self.list_tools_fn()
+        logger.info("📋 Found %d tools to return", len(tools))
+
+        result = (
+            len(tools),
+            orjson.dumps({
+                "tools": [
+                    {
+                        "name": tool.name,
+                        "description": tool.description,
+                        "inputSchema": tool.inputSchema
+                    }
+                    for tool in tools
+                ]
+            }),
+        )
+
+        if self.cache_tools and version == self._tools_version:
+            self._tools_cache = result
+        return result
 
     async def handle_message(
         self,
         request: Request,
         user: dict,
-    ) -> JSONResponse | Response:
+    ) -> Response:
         """Handle an MCP protocol message.
 
         Args:
@@ -59,56 +150,85 @@ class MCPProtocolHandler:
         Returns:
             JSON-RPC response or HTTP 200 for notifications
         """
+        raw = await request.body()
         try:
-            body = await request.json()
-            method = body.get("method")
-            params = body.get("params", {})
-            request_id = body.get("id")
+            body = orjson.loads(raw)
+        except orjson.JSONDecodeError as e:
+            logger.warning("Failed to parse MCP request body: %s", e)
+            return _json(
+                status_code=400,
+                content={
+                    "jsonrpc": "2.0",
+                    "id": None,
+                    "error": {
+                        "code": -32700,
+                        "message": "Parse error"
+                    }
+                }
+            )
 
-            logger.info(f"MCP request from {user['email']}: {method}")
+        if not isinstance(body, dict):
+            return _json(
+                status_code=400,
+                content={
+                    "jsonrpc": "2.0",
+                    "id": None,
+                    "error": {
+                        "code": -32600,
+                        "message": "Invalid Request"
+                    }
+                }
+            )
 
-            # Handle initialize
-            if method == "initialize":
-                return await self._handle_initialize(request_id, params, user)
+        request_id = body.get("id")
+        method = body.get("method")
+        params = body.get("params", {})
 
-            # Handle initialized notification
-            elif method == "initialized":
-                return await self._handle_initialized(user)
+        if not isinstance(method, str):
+            return _json(
+                status_code=400,
+                content={
+                    "jsonrpc": "2.0",
+                    "id": request_id,
+                    "error": {
+                        "code": -32600,
+                        "message": "Invalid Request: method must be a string"
+                    }
+                }
+            )
 
-            # Handle other notifications
-            elif method.startswith("notifications/") or method.startswith("$/"):
-                logger.info(f"Received notification: {method} from {user['email']}")
-                return Response(status_code=200, content="", media_type="text/plain")
+        try:
+            logger.info("MCP request from %s: %s", user["email"], method)
 
-            # Handle tools/list
-            elif method == "tools/list":
-                return await self._handle_tools_list(request_id, user)
+            handler = self._dispatch.get(method)
+            if handler:
+                return await handler(request_id, params, request, user)
 
-            # Handle tools/call
-            elif method == "tools/call":
-                return await self._handle_tools_call(request_id, params, request, user)
+            # Handle other notifications
+            if method.startswith(("notifications/", "$/")):
+                logger.info("Received notification: %s from %s", method, user["email"])
+                return Response(status_code=200, content="", media_type="text/plain")
 
             # Unknown method
-            else:
-                return JSONResponse(
-                    status_code=400,
-                    content={
-                        "jsonrpc": "2.0",
-                        "id": request_id,
-                        "error": {
-                            "code": -32601,
-                            "message": f"Method not found: {method}"
-                        }
+            return _json(
+                status_code=400,
+                content={
+                    "jsonrpc": "2.0",
+                    "id": request_id,
+                    "error": {
+                        "code": -32601,
+                        "message": f"Method not found: {method}"
                     }
-                )
+                }
+            )
 
         except Exception as e:
-            logger.error(f"Error handling MCP request: {e}", exc_info=True)
-            return JSONResponse(
+            logger.error("Error handling MCP request: %s", e, exc_info=True)
+            return _json(
                 status_code=500,
                 content={
                     "jsonrpc": "2.0",
-                    "id": body.get("id") if "body" in locals() else None,
+                    "id": request_id,
                     "error": {
                         "code": -32603,
                         "message": f"Internal error: {str(e)}"
@@ -116,65 +236,49 @@ class MCPProtocolHandler:
                 }
             )
 
-    async def _handle_initialize(self, request_id: Any, params: dict, user: dict) -> JSONResponse:
+    async def _handle_initialize(
+        self,
+        request_id: Any,
+        params: dict,
+        request: Request,
+        user: dict
+    ) -> Response:
         """Handle initialize request - return server capabilities."""
-        logger.info(f"📡 Handling initialize request from {user['email']}")
+        logger.info("📡 Handling initialize request from %s", user["email"])
+        logger.info("✅ Returning initialize response with capabilities: tools")
 
-        result = {
-            "protocolVersion": "2024-11-05",
-            "capabilities": {
-                "tools": {
-                    "listChanged": True
-                },
-            },
-            "serverInfo": {
-                "name": self.server_name,
-                "version": self.server_version
-            }
-        }
-
-        logger.info(f"✅ Returning initialize response with capabilities: tools")
+        return _json_result(request_id, self._initialize_result_json)
 
-        return JSONResponse(content={
-            "jsonrpc": "2.0",
-            "id": request_id,
-            "result": result
-        })
-
-    async def _handle_initialized(self, user: dict) -> Response:
+    async def _handle_initialized(
+        self,
+        request_id: Any,
+        params: dict,
+        request: Request,
+        user: dict
+    ) -> Response:
         """Handle initialized notification - handshake complete.
 
         Per JSON-RPC 2.0 spec, notifications do NOT get JSON-RPC responses.
         Return HTTP 200 with empty body.
         """
-        logger.info(f"✅ MCP client initialized notification from {user['email']}")
+        logger.info("✅ MCP client initialized notification from %s", user["email"])
         return Response(status_code=200, content="", media_type="text/plain")
 
-    async def _handle_tools_list(self, request_id: Any, user: dict) -> JSONResponse:
+    async def _handle_tools_list(
+        self,
+        request_id: Any,
+        params: dict,
+        request: Request,
+        user: dict
+    ) -> Response:
         """Handle tools/list request - return available tools."""
-        logger.info(f"🔧 Handling tools/list request from {user['email']}")
+        logger.info("🔧 Handling tools/list request from %s", user["email"])
 
-        tools = await self.list_tools_fn()
-        logger.info(f"📋 Found {len(tools)} tools to return")
+        tool_count, result_json = await self._get_tools_result()
 
-        result = {
-            "tools": [
-                {
-                    "name": tool.name,
-                    "description": tool.description,
-                    "inputSchema": tool.inputSchema
-                }
-                for tool in tools
-            ]
-        }
+        logger.info("✅ Returning tools/list response with %d tools", tool_count)
 
-        logger.info(f"✅ Returning tools/list response with {len(tools)} tools")
-
-        return JSONResponse(content={
-            "jsonrpc": "2.0",
-            "id": request_id,
-            "result": result
-        })
+        return _json_result(request_id, result_json)
 
     async def _handle_tools_call(
         self,
@@ -182,13 +286,13 @@ class MCPProtocolHandler:
         params: dict,
         request: Request,
         user: dict
-    ) -> JSONResponse:
+    ) -> Response:
         """Handle tools/call request - execute a tool."""
         tool_name = params.get("name")
         arguments = params.get("arguments", {})
 
         if not tool_name:
-            return JSONResponse(
+            return _json(
                 status_code=400,
                 content={
                     "jsonrpc": "2.0",
@@ -200,22 +304,18 @@ class MCPProtocolHandler:
                 }
             )
 
-        # Determine authentication method and extract token
-        auth_token = None
-        is_pat = False
-
-        # Check for PAT first (X-API-Key or other configured header)
-        # The header name should come from configuration
-        for header_name in ["X-API-Key", "Authorization"]:
-            token = request.headers.get(header_name)
-            if token:
-                if header_name == "X-API-Key":
-                    auth_token = token
-                    is_pat = True
-                else:
-                    auth_token = token
-                    is_pat = False
-                break
+        # Use the credential recorded by DualAuthenticator.authenticate
+        auth_token = getattr(request.state, "auth_token", None)
+        is_pat = getattr(request.state, "is_pat", False)
+
+        if auth_token is None:
+            # Authenticated some other way: fall back to the PAT header, then Authorization
+            pat_raw, authorization_raw, _ = scan_auth_headers(request.scope, self._pat_header)
+            if pat_raw:
+                auth_token = pat_raw.decode("latin-1")
+                is_pat = True
+            elif authorization_raw:
+                auth_token = authorization_raw.decode("latin-1")
 
         # Call the tool with full user context
         content_items = await self.call_tool_fn(
@@ -237,7 +337,7 @@ class MCPProtocolHandler:
             ]
         }
 
-        return JSONResponse(content={
+        return _json({
             "jsonrpc": "2.0",
             "id": request_id,
             "result": result
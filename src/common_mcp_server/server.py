@@ -10,10 +10,11 @@ Licensed under the Apache License, Version 2.0
 import logging
 from typing import Optional, Callable, Awaitable, Any
 
+import orjson
 from mcp.server import Server
 from mcp.types import Tool, TextContent
 from fastapi import APIRouter, Request, Depends
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 
 from .auth import DualAuthenticator, OAuthConfig, PATConfig
 from .protocol import MCPProtocolHandler
@@ -71,6 +72,7 @@ class MCPServer:
         resource_url: Optional[str] = None,
         tools_provider: Optional[Callable[[], Awaitable[list[Tool]]]] = None,
         oauth_router_config: Optional[OAuthRouterConfig] = None,
+        cache_tools: bool = False,
     ):
         """Initialize the MCP server.
 
@@ -84,6 +86,9 @@ class MCPServer:
             oauth_router_config: Configuration for OAuth discovery/proxy endpoints (optional).
                 If provided, enables Claude Desktop Custom Connector support via
                 /.well-known/* and /oauth/* endpoints.
+            cache_tools: Cache the tools/list result until invalidate_tools() is called
+                or the tools provider is replaced (default: False). Enable when the
+                tool set is static.
 
         Raises:
             ValueError: If neither oauth_config nor pat_config is provided
@@ -99,18 +104,37 @@ class MCPServer:
             resource_url=resource_url,
         )
 
+        # Static part of the GET info response, serialized once. The closing brace is
+        # dropped so the per-request "user" field can be appended.
+        info_payload = {
+            "name": self.name,
+            "version": self.version,
+            "transport": "http",
+            "authentication": [
+                method
+                for method, config in (("oauth2.1", oauth_config), ("pat", pat_config))
+                if config
+            ],
+            "endpoints": {
+                "protocol": "POST / (MCP JSON-RPC 2.0)",
+                "info": "GET / (Server info)"
+            }
+        }
+        self._info_json_prefix = orjson.dumps(info_payload)[:-1]
+
         # Initialize MCP server instance
         self.mcp_server = Server(name)
 
         # Store tools provider
         self._tools_provider = tools_provider
+        self._cache_tools = cache_tools
         self._tool_handler_fn: Optional[Callable] = None
 
         # Initialize protocol handler (will be created when tool handler is set)
         self._protocol_handler: Optional[MCPProtocolHandler] = None
 
-        # Create MCP router
-        self._router = APIRouter()
+        # Create MCP router (shutdown handler is merged into the app by include_router)
+        self._router = APIRouter(on_shutdown=[self.aclose])
 
         # Create OAuth router if configured
         self._oauth_router: Optional[APIRouter] = None
@@ -143,11 +167,14 @@ class MCPServer:
             self._tool_handler_fn = fn
 
             # Create protocol handler now that we have the tool handler
+            pat_config = self.authenticator.pat_config
             self._protocol_handler = MCPProtocolHandler(
                 server_name=self.name,
                 server_version=self.version,
                 list_tools_fn=self._list_tools,
                 call_tool_fn=fn,
+                cache_tools=self._cache_tools,
+                pat_header_name=pat_config.header_name if pat_config else None,
             )
 
             # Register routes
@@ -170,7 +197,7 @@ class MCPServer:
         async def mcp_post_endpoint(
             request: Request,
             user: dict = Depends(self.authenticator.authenticate)
-        ) -> JSONResponse:
+        ) -> Response:
             """MCP HTTP endpoint - handles MCP protocol messages.
 
             Headers:
@@ -196,23 +223,13 @@ class MCPServer:
         @self._router.get("")
         async def mcp_info_endpoint(
             user: dict = Depends(self.authenticator.authenticate)
-        ) -> JSONResponse:
+        ) -> Response:
             """MCP server information endpoint.
 
             Provides metadata about the MCP server for authenticated users.
             """
-            return JSONResponse(content={
-                "name": self.name,
-                "version": self.version,
-                "transport": "http",
-                "authentication": ["oauth2.1"] if self.authenticator.oauth_config else [] +
-                                ["pat"] if self.authenticator.pat_config else [],
-                "user": user["email"],
-                "endpoints": {
-                    "protocol": "POST / (MCP JSON-RPC 2.0)",
-                    "info": "GET / (Server info)"
-                }
-            })
+            content = self._info_json_prefix + b',"user":' + orjson.dumps(user["email"])
+            return Response(content=content + b"}", media_type="application/json")
 
     def get_router(self) -> APIRouter:
         """Get the FastAPI router for mounting in your application.
@@ -240,6 +257,23 @@ class MCPServer:
 
         return self._router
 
+    async def aclose(self) -> None:
+        """Release resources held by the server (e.g., pooled HTTP connections).
+
+        Registered as a shutdown handler on the router returned by get_router().
+        Applications that use a FastAPI ``lifespan`` instead of event handlers
+        should await this on shutdown.
+
+        Example:
+            ```python
+            @asynccontextmanager
+            async def lifespan(app: FastAPI):
+                yield
+                await mcp_server.aclose()
+            ```
+        """
+        await self.authenticator.aclose()
+
     def set_tools_provider(self, provider: Callable[[], Awaitable[list[Tool]]]):
         """Set the tools provider function.
 
@@ -257,6 +291,15 @@ class MCPServer:
             ```
         """
         self._tools_provider = provider
+        self.invalidate_tools()
+
+    def invalidate_tools(self):
+        """Discard the cached tools/list result (when cache_tools is enabled).
+
+        Call this after the set of tools changes so clients get the new list.
+        """
+        if self._protocol_handler:
+            self._protocol_handler.invalidate_tools()
 
     def get_oauth_router(self) -> Optional[APIRouter]:
         """Get the OAuth router for mounting in your application.
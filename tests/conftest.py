@@ -0,0 +1,43 @@
+"""Shared fixtures: an RSA signing key and a helper to mint OAuth access tokens."""
+
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+ISSUER = "https://auth.example.com/realms/test"
+KID = "test-key"
+
+_private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+@pytest.fixture
+def public_key():
+    return _private_key.public_key()
+
+
+@pytest.fixture
+def jwks_dict():
+    """The public key as a JWKS document, as served by the identity provider."""
+    jwk = jwt.algorithms.RSAAlgorithm.to_jwk(_private_key.public_key(), as_dict=True)
+    return {"keys": [{**jwk, "kid": KID, "use": "sig", "alg": "RS256"}]}
+
+
+@pytest.fixture
+def make_token():
+    def _make_token(kid: str = KID, **claims) -> str:
+        now = int(time.time())
+        payload = {
+            "iss": ISSUER,
+            "sub": "user-123",
+            "email": "user@example.com",
+            "preferred_username": "user",
+            "name": "Test User",
+            "iat": now,
+            "exp": now + 300,
+            **claims,
+        }
+        return jwt.encode(payload, _private_key, algorithm="RS256", headers={"kid": kid})
+
+    return _make_token
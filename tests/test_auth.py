@@ -0,0 +1,178 @@
+"""Tests for token validation and rejection caching in DualAuthenticator."""
+
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import HTTPException, Request
+
+from common_mcp_server.auth import DualAuthenticator, OAuthConfig, PATConfig, TokenValidationError
+
+from conftest import ISSUER, KID
+
+
+def _request(headers: dict) -> Request:
+    return Request({
+        "type": "http",
+        "method": "POST",
+        "path": "/mcp",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+    })
+
+
+async def _assert_rejected(authenticator: DualAuthenticator, headers: dict) -> str:
+    with pytest.raises(HTTPException) as exc_info:
+        await authenticator.authenticate(_request(headers))
+    assert exc_info.value.status_code == 401
+    return exc_info.value.detail
+
+
+@pytest.fixture
+def make_authenticator(public_key):
+    def _make_authenticator(**config) -> DualAuthenticator:
+        authenticator = DualAuthenticator(
+            oauth_config=OAuthConfig(
+                jwks_url="https://unused.invalid/certs", issuer=ISSUER, **config
+            )
+        )
+
+        async def fetch_jwks():
+            authenticator.fetch_calls += 1
+            return {KID: public_key}
+
+        authenticator.fetch_calls = 0
+        authenticator._fetch_jwks = fetch_jwks
+        return authenticator
+
+    return _make_authenticator
+
+
+@pytest.mark.asyncio
+async def test_canonical_keys_only_by_default(make_authenticator, make_token):
+    authenticator = make_authenticator()
+    token = make_token(realm_access={"roles": ["user"]})
+
+    user = await authenticator._validate_oauth_token(f"Bearer {token}")
+
+    assert user == {
+        "user_id": "user-123",
+        "email": "user@example.com",
+        "username": "user",
+        "name": "Test User",
+        "auth_method": "oauth",
+    }
+    await authenticator.aclose()
+
+
+@pytest.mark.asyncio
+async def test_passthrough_claims_are_not_shared_with_cache(make_authenticator, make_token):
+    authenticator = make_authenticator(passthrough_claims=True)
+    authorization = f"Bearer {make_token(realm_access={'roles': ['user']})}"
+
+    first = await authenticator._validate_oauth_token(authorization)
+    assert first["realm_access"] == {"roles": ["user"]}
+    assert first["user_id"] == "user-123"
+    first["realm_access"]["roles"].append("admin")
+
+    # Second call is served from the token cache
+    second = await authenticator._validate_oauth_token(authorization)
+    assert second["realm_access"] == {"roles": ["user"]}
+    await authenticator.aclose()
+
+
+@pytest.mark.asyncio
+async def test_bad_pat_is_served_from_cache():
+    calls = 0
+
+    async def verify(token, request):
+        nonlocal calls
+        calls += 1
+        return None
+
+    authenticator = DualAuthenticator(
+        pat_config=PATConfig(header_name="X-API-Key", prefix="api_", verify_function=verify)
+    )
+
+    for _ in range(3):
+        detail = await _assert_rejected(authenticator, {"X-API-Key": "api_bogus"})
+        assert detail == "Invalid or expired personal access token"
+    assert calls == 1
+
+
+@pytest.mark.asyncio
+async def test_jwks_fetch_error_is_not_cached(make_authenticator, make_token):
+    authenticator = make_authenticator()
+    calls = 0
+
+    async def failing_fetch():
+        nonlocal calls
+        calls += 1
+        raise TokenValidationError("Unable to fetch public keys: down", transient=True)
+
+    authenticator._fetch_jwks = failing_fetch
+    headers = {"Authorization": f"Bearer {make_token()}"}
+
+    for _ in range(2):
+        await _assert_rejected(authenticator, headers)
+    assert calls == 2
+    assert len(authenticator._bad_token_cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_not_yet_valid_token_is_not_cached(make_authenticator, make_token):
+    authenticator = make_authenticator()
+    headers = {"Authorization": f"Bearer {make_token(nbf=int(time.time()) + 120)}"}
+
+    detail = await _assert_rejected(authenticator, headers)
+    assert "not yet valid" in detail
+    assert len(authenticator._bad_token_cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_unknown_kid_is_not_cached_when_refresh_is_rate_limited(
+    make_authenticator, make_token
+):
+    authenticator = make_authenticator()
+    # Warm the JWKS cache so the forced refresh for the unknown kid is skipped
+    await authenticator._get_jwks()
+    headers = {"Authorization": f"Bearer {make_token(kid='rotated-key')}"}
+
+    detail = await _assert_rejected(authenticator, headers)
+    assert "no signing key found" in detail
+    assert authenticator.fetch_calls == 1
+    assert len(authenticator._bad_token_cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_unknown_kid_is_cached_after_real_fetch(make_authenticator, make_token):
+    authenticator = make_authenticator()
+    headers = {"Authorization": f"Bearer {make_token(kid='rotated-key')}"}
+
+    await _assert_rejected(authenticator, headers)
+    assert authenticator.fetch_calls == 1
+    assert len(authenticator._bad_token_cache) == 1
+
+
+@pytest.mark.asyncio
+async def test_expired_token_is_cached(make_authenticator, make_token):
+    authenticator = make_authenticator()
+    now = int(time.time())
+    headers = {"Authorization": f"Bearer {make_token(iat=now - 600, exp=now - 120)}"}
+
+    assert await _assert_rejected(authenticator, headers) == "Token has expired"
+    assert len(authenticator._bad_token_cache) == 1
+    assert await _assert_rejected(authenticator, headers) == "Token has expired"
+
+
+@pytest.mark.asyncio
+async def test_bad_signature_is_cached(make_authenticator, make_token):
+    authenticator = make_authenticator()
+    other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    valid = jwt.decode(make_token(), options={"verify_signature": False})
+    forged = jwt.encode(valid, other_key, algorithm="RS256", headers={"kid": KID})
+    headers = {"Authorization": f"Bearer {forged}"}
+
+    detail = await _assert_rejected(authenticator, headers)
+    assert "Signature verification failed" in detail
+    assert len(authenticator._bad_token_cache) == 1
@@ -0,0 +1,140 @@
+"""Tests for JWKS caching, background refresh, and fetch coalescing."""
+
+import asyncio
+import time
+
+import pytest
+
+from common_mcp_server.auth import (
+    JWKS_MIN_REFRESH_INTERVAL,
+    DualAuthenticator,
+    OAuthConfig,
+    TokenValidationError,
+)
+
+from conftest import ISSUER
+
+OLD_KEYS = {"old": object()}
+NEW_KEYS = {"new": object()}
+
+
+class StubFetch:
+    """Stands in for DualAuthenticator._fetch_jwks, counting calls.
+
+    Until ``release`` is set, each call waits, so tests can observe in-flight state.
+    """
+
+    def __init__(self, result=NEW_KEYS, error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.error:
+            raise self.error
+        return self.result
+
+
+@pytest.fixture
+def authenticator():
+    return DualAuthenticator(
+        oauth_config=OAuthConfig(jwks_url="https://unused.invalid/certs", issuer=ISSUER)
+    )
+
+
+def _prime_cache(authenticator, soft_expired=False, hard_expired=False):
+    """Fill the cache with OLD_KEYS, optionally past the soft or hard expiry."""
+    now = time.monotonic()
+    authenticator._jwks_cache = OLD_KEYS
+    authenticator._jwks_fetched_at = now - 400
+    authenticator._jwks_cache_expiry = now - 1 if soft_expired or hard_expired else now + 100
+    authenticator._jwks_stale_expiry = now - 1 if hard_expired else now + 100
+
+
+@pytest.mark.asyncio
+async def test_stale_keys_served_while_one_background_refresh_runs(authenticator):
+    fetch = authenticator._fetch_jwks = StubFetch()
+    _prime_cache(authenticator, soft_expired=True)
+
+    results = [await authenticator._get_jwks() for _ in range(5)]
+    assert all(keys is OLD_KEYS for keys in results)
+
+    task = authenticator._jwks_refresh_task
+    assert task is not None
+    await asyncio.sleep(0.01)
+    assert fetch.calls == 1
+
+    fetch.release.set()
+    await task
+    assert authenticator._jwks_refresh_task is None
+    assert await authenticator._get_jwks() is NEW_KEYS
+    assert fetch.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_background_refresh_keeps_stale_keys_and_backs_off(authenticator):
+    fetch = authenticator._fetch_jwks = StubFetch(
+        error=TokenValidationError("boom", transient=True)
+    )
+    fetch.release.set()
+    _prime_cache(authenticator, soft_expired=True)
+
+    assert await authenticator._get_jwks() is OLD_KEYS
+    await authenticator._jwks_refresh_task
+    assert fetch.calls == 1
+
+    # Backed off: the stale keys count as fresh for about JWKS_MIN_REFRESH_INTERVAL
+    remaining = authenticator._jwks_cache_expiry - time.monotonic()
+    assert 0 < remaining <= JWKS_MIN_REFRESH_INTERVAL
+    assert await authenticator._get_jwks() is OLD_KEYS
+    assert authenticator._jwks_refresh_task is None
+    assert fetch.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_caller_blocks_past_hard_expiry(authenticator):
+    fetch = authenticator._fetch_jwks = StubFetch()
+    _prime_cache(authenticator, hard_expired=True)
+
+    caller = asyncio.create_task(authenticator._get_jwks())
+    await asyncio.sleep(0.01)
+    assert not caller.done()
+    assert fetch.calls == 1
+
+    fetch.release.set()
+    assert await caller is NEW_KEYS
+
+
+@pytest.mark.asyncio
+async def test_concurrent_cold_callers_share_one_fetch(authenticator):
+    fetch = authenticator._fetch_jwks = StubFetch()
+
+    callers = [asyncio.create_task(authenticator._get_jwks()) for _ in range(50)]
+    await asyncio.sleep(0.01)
+    fetch.release.set()
+
+    results = await asyncio.gather(*callers)
+    assert all(keys is NEW_KEYS for keys in results)
+    assert fetch.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelling_first_caller_does_not_fail_other_waiters(authenticator):
+    fetch = authenticator._fetch_jwks = StubFetch()
+
+    first = asyncio.create_task(authenticator._get_jwks())
+    await asyncio.sleep(0.01)
+    others = [asyncio.create_task(authenticator._get_jwks()) for _ in range(3)]
+    await asyncio.sleep(0.01)
+
+    first.cancel()
+    await asyncio.sleep(0)
+    fetch.release.set()
+
+    assert await asyncio.gather(*others) == [NEW_KEYS] * 3
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    assert fetch.calls == 1
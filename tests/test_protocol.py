@@ -0,0 +1,76 @@
+"""Tests for JSON-RPC message handling in MCPProtocolHandler."""
+
+import orjson
+import pytest
+from fastapi import Request
+
+from common_mcp_server.protocol import MCPProtocolHandler
+
+USER = {"user_id": "user-123", "email": "user@example.com"}
+
+
+async def _no_tools():
+    return []
+
+
+async def _no_call(name, arguments, auth_token, user, is_pat):
+    return []
+
+
+def _request(body: bytes) -> Request:
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return Request({"type": "http", "method": "POST", "path": "/mcp", "headers": []}, receive)
+
+
+@pytest.fixture
+def handler():
+    return MCPProtocolHandler(
+        server_name="test-server",
+        server_version="1.0.0",
+        list_tools_fn=_no_tools,
+        call_tool_fn=_no_call,
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("method", [["tools/list"], {"name": "tools/list"}, 42, None])
+async def test_non_string_method_is_invalid_request(handler, method):
+    body = orjson.dumps({"jsonrpc": "2.0", "id": 7, "method": method})
+
+    response = await handler.handle_message(_request(body), USER)
+
+    assert response.status_code == 400
+    assert orjson.loads(response.body) == {
+        "jsonrpc": "2.0",
+        "id": 7,
+        "error": {"code": -32600, "message": "Invalid Request: method must be a string"},
+    }
+
+
+@pytest.mark.asyncio
+async def test_tools_call_fallback_uses_configured_pat_header():
+    seen = {}
+
+    async def record_call(name, arguments, auth_token, user, is_pat):
+        seen.update(auth_token=auth_token, is_pat=is_pat)
+        return []
+
+    handler = MCPProtocolHandler(
+        server_name="test-server",
+        server_version="1.0.0",
+        list_tools_fn=_no_tools,
+        call_tool_fn=record_call,
+        pat_header_name="X-Custom-Token",
+    )
+    body = orjson.dumps({
+        "jsonrpc": "2.0", "id": 1, "method": "tools/call", "params": {"name": "echo"}
+    })
+    request = _request(body)
+    request.scope["headers"] = [(b"x-custom-token", b"pat_123"), (b"x-api-key", b"other")]
+
+    response = await handler.handle_message(request, USER)
+
+    assert response.status_code == 200
+    assert seen == {"auth_token": "pat_123", "is_pat": True}
@@ -0,0 +1,52 @@
+"""Tests for MCPServer routing and lifecycle."""
+
+import httpx
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from common_mcp_server import MCPServer, OAuthConfig
+
+from conftest import ISSUER
+
+
+def _make_app(jwks_dict):
+    mcp_server = MCPServer(
+        name="test-server",
+        oauth_config=OAuthConfig(jwks_url="https://auth.example.com/certs", issuer=ISSUER),
+    )
+
+    @mcp_server.tool_handler()
+    async def handle_tool(name, arguments, auth_token, user, is_pat):
+        return []
+
+    # Serve the JWKS locally instead of over the network
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, json=jwks_dict))
+    mcp_server.authenticator._create_http_client = lambda: httpx.AsyncClient(
+        transport=transport
+    )
+
+    app = FastAPI()
+    app.include_router(mcp_server.get_router(), prefix="/mcp")
+    return app, mcp_server
+
+
+def test_oauth_works_across_repeated_lifespans(jwks_dict, make_token):
+    app, mcp_server = _make_app(jwks_dict)
+    headers = {"Authorization": f"Bearer {make_token()}"}
+
+    # First lifespan never touches OAuth, so the JWKS cache stays cold
+    with TestClient(app):
+        pass
+    assert mcp_server.authenticator._http is None
+
+    with TestClient(app) as client:
+        response = client.get("/mcp", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["user"] == "user@example.com"
+
+    # Shutdown closed the client; a later lifespan must fetch with a fresh one
+    mcp_server.authenticator._jwks_cache = None
+    mcp_server.authenticator._token_cache.clear()
+    with TestClient(app) as client:
+        response = client.get("/mcp", headers=headers)
+    assert response.status_code == 200